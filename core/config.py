@@ -1,6 +1,6 @@
 import json
 from pathlib import Path
-from typing import TypedDict
+from typing import Literal, NotRequired, TypedDict
 
 
 class BaseType(TypedDict):
@@ -18,6 +18,7 @@ class BaseFields(TypedDict):
 class Config(TypedDict):
     refresh_token: str
     telegram_bot_token: str
+    ugoira_format: NotRequired[Literal["webp", "apng"]]
     follow: BaseFields
     favorite: BaseFields
     ranking: BaseFields
@@ -1,6 +1,8 @@
 import time
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Any, TypedDict
+from typing import Any, Literal, TypedDict
 
 from pixivpy3 import AppPixivAPI
 
@@ -9,6 +11,11 @@ from core.logger import Logger
 from lib import utils
 
 type Qs = dict[str, Any] | None
+type IllustType = Literal["illust", "manga"]
+type UgoiraFormat = Literal["webp", "apng"]
+
+UGOIRA_FORMATS: tuple[UgoiraFormat, ...] = ("webp", "apng")
+UGOIRA_WORKERS = 2
 
 
 class Illust(TypedDict):
@@ -17,6 +24,7 @@ class Illust(TypedDict):
     create_date: str
     image_urls: list[str]
     user_id: int
+    type: str
 
 
 class UserIllust(TypedDict):
@@ -74,19 +82,19 @@ class Pixiv(AppPixivAPI):
         self.logger.info(f"Process {len(user_follow_collect)} follow")
         return user_follow_collect
 
-    def collect_illusts(self, user_id: int | str, user_name: str) -> UserIllust:
+    def collect_illusts(self, user_id: int | str, user_name: str, type: IllustType = "illust") -> UserIllust:
         illust_collect: list[Illust] = []
 
-        self.logger.info(f"Collecting illusts from user {user_name}_{user_id}")
+        self.logger.info(f"Collecting {type} from user {user_name}_{user_id}")
 
-        qs: Qs = {"user_id": user_id, "type": "illust"}
+        qs: Qs = {"user_id": user_id, "type": type}
         while qs:
             r = self.user_illusts(**qs)
             next_url = r.get("next_url")
             illusts = r.get("illusts")
 
             if illusts is None:
-                self.logger.error(f"Failed to collect illusts from user {user_id}, illusts is none")
+                self.logger.error(f"Failed to collect {type} from user {user_id}, illusts is none")
                 qs = self.parse_qs(next_url)
                 time.sleep(1)
                 continue
@@ -98,6 +106,7 @@ class Pixiv(AppPixivAPI):
                     "user_id": illust.get("user").get("id"),
                     "create_date": illust.get("create_date"),
                     "image_urls": [],
+                    "type": illust.get("type"),
                 }
 
                 if illust.get("meta_single_page"):
@@ -117,49 +126,124 @@ class Pixiv(AppPixivAPI):
             "illusts": illust_collect,
         }
 
-    def process_illusts(self, UserIllusts: list[UserIllust], root_path: Path):
-        root_path = root_path.joinpath("illusts")
+    def process_illusts(
+        self,
+        UserIllusts: list[UserIllust],
+        root_path: Path,
+        type: IllustType = "illust",
+        ugoira_format: UgoiraFormat = "webp",
+    ):
+        root_path = root_path.joinpath("illusts" if type == "illust" else "manga")
 
-        for userIllust in UserIllusts:
-            path = utils.create_folder_path(
-                root_path=root_path,
-                id=userIllust.get("user_id"),
-                name=userIllust.get("user_name"),
-                logger=self.logger,
-            )
+        self.ugoira_executor = ProcessPoolExecutor(max_workers=UGOIRA_WORKERS)
+        ugoira_pending: dict[Future[Path], Illust] = {}
 
-            self.logger.info(f"Start Processing illusts from {userIllust.get('user_name')}")
+        try:
+            for userIllust in UserIllusts:
+                path = utils.create_folder_path(
+                    root_path=root_path,
+                    id=userIllust.get("user_id"),
+                    name=userIllust.get("user_name"),
+                    logger=self.logger,
+                )
 
-            count = 0
-            for illust in userIllust.get("illusts"):
-                illust_id = illust.get("id")
+                self.logger.info(f"Start Processing {type} from {userIllust.get('user_name')}")
 
-                with SQLiteDB() as db:
-                    c = db.cursor()
-                    c.execute("SELECT id FROM illust WHERE id = ?", (illust_id,))
-                    if c.fetchone():
-                        continue
+                count = 0
+                ugoira_count = 0
+                backfill_count = 0
+                for illust in userIllust.get("illusts"):
+                    self.finish_ugoiras(ugoira_pending, timeout=0)
 
-                    illust_title = illust.get("title")
-                    illust_user_id = illust.get("user_id")
-
-                    try:
-                        self.logger.info(f"Processing illust {illust_id}_{illust_title}")
-                        self.download_illust(illust=illust, root_path=path)
-                        c.execute(
-                            "INSERT INTO illust (id, title, user_id) VALUES (?, ?, ?)",
-                            (illust_id, illust_title, illust_user_id),
-                        )
-                        count += 1
-                    except Exception as e:
-                        self.logger.error(f"Failed to download {illust_id}: {e}")
-                        continue
+                    illust_id = illust.get("id")
+                    is_ugoira = illust.get("type") == "ugoira"
 
-            self.logger.info(
-                f"Success add {count} illust from {userIllust.get('user_name')}"
-                if count > 0
-                else f"No new illust from {userIllust.get('user_name')}"
-            )
+                    with SQLiteDB() as db:
+                        c = db.cursor()
+                        c.execute("SELECT id FROM illust WHERE id = ?", (illust_id,))
+                        synced = c.fetchone() is not None
+                        if synced and not is_ugoira:
+                            continue
+
+                        illust_title = illust.get("title")
+                        illust_user_id = illust.get("user_id")
+
+                        try:
+                            if is_ugoira:
+                                file_path = self.get_ugoira_path(illust, path, ugoira_format)
+                                if any(file_path.with_suffix(suffix).exists() for suffix in (".webp", ".png")):
+                                    if not synced:
+                                        c.execute(
+                                            "INSERT INTO illust (id, title, user_id) VALUES (?, ?, ?)",
+                                            (illust_id, illust_title, illust_user_id),
+                                        )
+                                        backfill_count += 1
+                                    continue
+
+                                self.logger.info(
+                                    f"Re-processing ugoira {illust_id}_{illust_title}, it was synced as a static frame"
+                                    if synced
+                                    else f"Processing ugoira {illust_id}_{illust_title}"
+                                )
+                                self.download_ugoira(illust=illust, file_path=file_path, pending=ugoira_pending)
+                                ugoira_count += 1
+                                continue
+
+                            self.logger.info(f"Processing {type} {illust_id}_{illust_title}")
+                            self.download_illust(illust=illust, root_path=path)
+                            c.execute(
+                                "INSERT INTO illust (id, title, user_id) VALUES (?, ?, ?)",
+                                (illust_id, illust_title, illust_user_id),
+                            )
+                            count += 1
+                        except Exception as e:
+                            self.logger.error(f"Failed to download {illust_id}: {e}")
+                            continue
+
+                summary = [f"{count} {type}"] if count > 0 else []
+                if ugoira_count > 0:
+                    summary.append(f"{ugoira_count} ugoira queued for conversion")
+                if backfill_count > 0:
+                    summary.append(f"{backfill_count} converted ugoira recorded")
+
+                self.logger.info(
+                    f"Success add {', '.join(summary)} from {userIllust.get('user_name')}"
+                    if summary
+                    else f"No new {type} from {userIllust.get('user_name')}"
+                )
+
+            if ugoira_pending:
+                self.logger.info(f"Waiting for {len(ugoira_pending)} ugoira conversion")
+            self.finish_ugoiras(ugoira_pending)
+        finally:
+            self.ugoira_executor.shutdown(cancel_futures=True)
+
+    def finish_ugoiras(self, pending: dict[Future[Path], Illust], timeout: float | None = None):
+        if not pending:
+            return
+
+        done, _ = wait(pending, timeout=timeout)
+        for future in done:
+            illust = pending.pop(future)
+            illust_id = illust.get("id")
+            illust_title = illust.get("title")
+
+            try:
+                file_path = future.result()
+                utils.fix_img_datetime(file_path, illust.get("create_date"))
+                with SQLiteDB() as db:
+                    db.cursor().execute(
+                        "INSERT OR IGNORE INTO illust (id, title, user_id) VALUES (?, ?, ?)",
+                        (illust_id, illust_title, illust.get("user_id")),
+                    )
+            except BrokenProcessPool:
+                self.logger.error(f"Failed to convert ugoira {illust_id}: worker process died, likely out of memory")
+                continue
+            except Exception as e:
+                self.logger.error(f"Failed to convert ugoira {illust_id}: {e}")
+                continue
+
+            self.logger.info(f"Success add ugoira {illust_id}_{illust_title}")
 
     def download_illust(self, illust: Illust, root_path: Path):
         id = illust.get("id")
@@ -178,6 +262,30 @@ class Pixiv(AppPixivAPI):
             utils.download_file(file_path, url)
             utils.fix_img_datetime(file_path, illust.get("create_date"))
 
+    def get_ugoira_path(self, illust: Illust, root_path: Path, ugoira_format: UgoiraFormat = "webp") -> Path:
+        title = utils.normalize_name(illust.get("title"))
+        return root_path.joinpath(f"{title}_{illust.get('id')}_ugoira.{'webp' if ugoira_format == 'webp' else 'png'}")
+
+    def download_ugoira(self, illust: Illust, file_path: Path, pending: dict[Future[Path], Illust]):
+        r = self.ugoira_metadata(illust.get("id"))
+        metadata = r.get("ugoira_metadata")
+        if metadata is None:
+            raise ValueError(f"ugoira_metadata is none, {r.get('error')}")
+
+        # the medium zip holds 600x600 frames, the same path with 1920x1080 holds the original size
+        zip_url = metadata.get("zip_urls").get("medium").replace("600x600", "1920x1080")
+        frames = [{"file": frame.get("file"), "delay": frame.get("delay")} for frame in metadata.get("frames")]
+
+        try:
+            future = self.ugoira_executor.submit(utils.convert_ugoira, zip_url, frames, file_path)
+        except BrokenProcessPool:
+            self.logger.error("Ugoira worker process died, likely out of memory, restarting the pool")
+            self.ugoira_executor.shutdown(wait=False, cancel_futures=True)
+            self.ugoira_executor = ProcessPoolExecutor(max_workers=UGOIRA_WORKERS)
+            future = self.ugoira_executor.submit(utils.convert_ugoira, zip_url, frames, file_path)
+
+        pending[future] = illust
+
     def collect_novels(self, user_id: int | str, user_name: str):
         collect: tuple[list[Novel], list[NovelSeries]] = ([], [])
 
@@ -1,6 +1,8 @@
 import logging
 import os
+import zipfile
 from datetime import datetime
+from io import BytesIO
 from pathlib import Path
 
 
@@ -66,16 +68,63 @@ def fix_img_datetime(file_path: Path, date: str):
     os.utime(file_path, (ts, ts))
 
 
+HEADERS = {
+    "Referer": "https://app-api.pixiv.net/",
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36",
+}
+
+
 def download_file(file_path: Path, url: str):
     import requests
 
-    headers = {
-        "Referer": "https://app-api.pixiv.net/",
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36",
-    }
-
-    with requests.get(url, headers=headers, stream=True) as r:
+    with requests.get(url, headers=HEADERS, stream=True) as r:
         r.raise_for_status()
         with file_path.open("wb") as file:
             for chunk in r.iter_content(chunk_size=8192):
                 file.write(chunk)
+
+
+def download_buffer(url: str) -> BytesIO:
+    import requests
+
+    buffer = BytesIO()
+    with requests.get(url, headers=HEADERS, stream=True) as r:
+        r.raise_for_status()
+        for chunk in r.iter_content(chunk_size=65536):
+            buffer.write(chunk)
+
+    return buffer
+
+
+def convert_ugoira(zip_url: str, frames: list[dict], file_path: Path) -> Path:
+    from PIL import Image
+
+    images: list[Image.Image] = []
+    durations: list[int] = []
+    with zipfile.ZipFile(download_buffer(zip_url)) as zf:
+        for frame in frames:
+            with zf.open(frame.get("file")) as f:
+                image = Image.open(f)
+                image.load()
+            images.append(image.convert("RGB"))
+            durations.append(frame.get("delay"))
+
+    if not images:
+        raise ValueError(f"No frames found for {file_path.name}")
+
+    tmp_path = file_path.with_name(f"{file_path.name}.part")
+    try:
+        images[0].save(
+            tmp_path,
+            format="WEBP" if file_path.suffix == ".webp" else "PNG",
+            save_all=True,
+            append_images=images[1:],
+            duration=durations,
+            loop=0,
+        )
+        tmp_path.replace(file_path)
+    except Exception:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    return file_path